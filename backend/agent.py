@@ -16,8 +16,27 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
     raise ValueError("Set OPENROUTER_API_KEY in your environment")
 
+# The tools, and so the system prompt, are fixed; build them once at import
+# so every agent request shares an identical (provider-cacheable) prompt prefix
+tools = LocalToolkit().get_tools()
+tools_str = "\n".join([f"{tool.name}: {tool.description}" for tool in tools])
+
+system_prompt_str = f"""
+    You are a research assistant and summarization agent. Your goal is to provide 
+    clear, accurate, and concise summaries of historical newspaper content in 
+    response to user queries.
+
+    You have the following tool(s) available to you to achieve your goal:
+    {tools_str}
+    """
+
+_agent = None
+
 # Build the agent
 def build_agent():
+    global _agent
+    if _agent is not None:
+        return _agent
 
     print("STARTED BUILDING AGENT!")
     # LLM using OpenRouter
@@ -29,30 +48,15 @@ def build_agent():
         base_url="https://openrouter.ai/api/v1"
     )
 
-    # Create Local Toolkit
-    toolkit = LocalToolkit()
-    tools = toolkit.get_tools()
-
-    tools_str = "\n".join([f"{tool.name}: {tool.description}" for tool in tools])
-
-    system_prompt_str = f"""
-        You are a research assistant and summarization agent. Your goal is to provide 
-        clear, accurate, and concise summaries of historical newspaper content in 
-        response to user queries.
-
-        You have the following tool(s) available to you to achieve your goal:
-        {tools_str}
-        """
-
     # Create agent
-    agent = create_agent(
+    _agent = create_agent(
         llm,
         tools,
         system_prompt=system_prompt_str
     )
 
     print("FINISHED BUILDING AGENT!")
-    return agent
+    return _agent
 
 def main():
 
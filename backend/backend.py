@@ -1,11 +1,17 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
+from waitress import serve
 import os
-from search import search_documents, get_cached_index_only
+import json
+from search import search_documents, get_cached_index_only, DocumentIndex
 from agent import build_agent
 from local_toolkit import set_agent_documents
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage
 import threading
+import functools
+import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,16 +19,21 @@ load_dotenv()
 DEMO_MODE = os.getenv('VITE_DEMO_MODE', 'true').lower() == 'true'
 DEMO_PATH = os.getenv('VITE_DEMO_PATH', 'tests/data/')
 
-# Global variable to hold the agent's last response
-agent_response = None
 agent = None
 
+# Agent prompts run in the background; the frontend polls for their results by task id
+AGENT_TASK_TTL = 600  # seconds after submission before a finished, unclaimed result is dropped
+agent_executor = ThreadPoolExecutor(max_workers=4)
+agent_tasks = {}     # task_id -> (Future, submission time)
+agent_tasks_lock = threading.Lock()
+
 # ==============================
 # Flask app setup
 # ==============================
 app = Flask(__name__, static_folder='../frontend/dist', static_url_path='')
 CORS(app, origins=["http://localhost:5173"])
 documents = []       # Stored as relative paths
+index_lock = threading.Lock()  # held while (re)loading documents
 
 # Serve index.html at root
 @app.route('/')
@@ -50,21 +61,53 @@ def list_dirs():
     if not os.path.isdir(base_abs):
         return jsonify({'dirs': []})
 
-    dirs = []
-    for entry in os.scandir(base_abs):
-        if entry.is_dir():
-            dirs.append({
-                'name': entry.name,
-                'full': os.path.relpath(entry.path, base_abs)  # relative to requested path
-            })
-
-    return jsonify({'dirs': dirs})
+    # stream the entries as scandir yields them, rather than building the whole list first
+    # (the directory is opened here, so an error opening it is still an error response rather than a truncated 200)
+    it = os.scandir(base_abs)
+
+    def generate():
+        yield '{"dirs": ['
+        first = True
+        with it:
+            for entry in it:
+                if entry.is_dir():
+                    if not first:
+                        yield ', '
+                    first = False
+                    yield json.dumps({
+                        'name': entry.name,
+                        'full': os.path.relpath(entry.path, base_abs)  # relative to requested path
+                    })
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@functools.lru_cache(maxsize=4096)
+def _list_dir_files(dir, mtime):
+    """
+    List the files in dir, along with a {path: position} lookup of that listing.
+    mtime is only part of the cache key, so the listing is refreshed whenever the directory changes.
+    """
+    with os.scandir(dir) as it:
+        # DirEntry.is_file reuses the file type from the directory read instead of a stat per entry
+        all_files = sorted(entry.path for entry in it if entry.is_file())
+    return all_files, {f: i for i, f in enumerate(all_files)}
 
 def build_index(path):
     global documents
-    results = get_cached_index_only(path)
-    documents = results
-    set_agent_documents(results)
+    with index_lock:
+        # always reload: the caches may have been created or rebuilt since the last load, and reading an unchanged
+        # cache again is cheap (see _load_cached_index)
+        results = get_cached_index_only(path)
+
+        # list the directories of the indexed documents now, so searches only need cache lookups
+        for dir in {os.path.dirname(doc.path) for doc in results}:
+            if os.path.isdir(dir):
+                _list_dir_files(dir, os.path.getmtime(dir))
+
+        # stack the embeddings once here rather than on every search
+        documents = DocumentIndex(results)
+        set_agent_documents(documents)
 
 @app.route('/api/set-path', methods=['POST'])
 def set_path():
@@ -103,7 +146,10 @@ def search():
         return jsonify({'results': []})
 
     # Now search uses absolute paths internally
-    matches = search_documents(query, documents, top_k=5)
+    # (waiting for any in-progress indexing rather than searching the previous directory's documents)
+    with index_lock:
+        current_documents = documents
+    matches = search_documents(query, current_documents, top_k=5)
 
     grouped = {}
 
@@ -112,15 +158,27 @@ def search():
         dir = os.path.dirname(path)
 
         if dir not in grouped:
-            # list all files in that dir
-            all_files = [os.path.join(dir, f) for f in os.listdir(dir) if os.path.isfile(os.path.join(dir, f))]
+            # list all files in that dir (reusing the listing made at indexing time if the dir is unchanged)
+            all_files, file_index = _list_dir_files(dir, os.path.getmtime(dir))
             grouped[dir] = {
                 'all_files': all_files,
-                'matching_indices': []
+                'file_index': file_index,
+                'matching_indices': [],
+                'relisted': False
             }
 
-        all_files = grouped[dir]['all_files']
-        idx = all_files.index(path)
+        idx = grouped[dir]['file_index'].get(path)
+        if idx is None and not grouped[dir]['relisted']:
+            # the cached listing is stale (e.g. the file was added within the dir's mtime resolution); re-list once without the cache
+            old_files = grouped[dir]['all_files']
+            all_files, file_index = _list_dir_files.__wrapped__(dir, None)
+            grouped[dir]['all_files'] = all_files
+            grouped[dir]['file_index'] = file_index
+            grouped[dir]['relisted'] = True
+            grouped[dir]['matching_indices'] = [file_index[old_files[i]] for i in grouped[dir]['matching_indices'] if old_files[i] in file_index]
+            idx = file_index.get(path)
+        if idx is None:
+            continue
         grouped[dir]['matching_indices'].append(idx)
 
     # Convert grouped result into list
@@ -136,28 +194,59 @@ def search():
 # ------------------------------
 # Agent endpoints
 # ------------------------------
+def _run_agent(prompt):
+    try:
+        user_question = HumanMessage(content=prompt)
+        agent_response = agent.invoke({"messages": [user_question]})
+
+        # Extract the first non-empty AIMessage content (summary)
+        return next((
+            msg.content for msg in agent_response["messages"]
+            if isinstance(msg, AIMessage) and msg.content and not msg.content.isspace()
+        ), "")
+    except Exception as e:
+        return {"error": str(e)}
+
+def _evict_stale_agent_tasks():
+    """
+    Drop finished tasks whose results were never collected (e.g. the client went away).
+    Must be called with agent_tasks_lock held.
+    """
+    now = time.monotonic()
+    stale = [task_id for task_id, (future, submitted) in agent_tasks.items() if future.done() and now - submitted > AGENT_TASK_TTL]
+    for task_id in stale:
+        del agent_tasks[task_id]
+
 @app.route('/api/agent/send', methods=['POST'])
 def send_agent_prompt():
-    global agent_response
     data = request.get_json()
     prompt = data.get('prompt')
     if not prompt:
         return jsonify({'error': 'No prompt provided'}), 400
 
-    try:
-        user_question = HumanMessage(content=prompt)
-        agent_response = agent.invoke({"messages": [user_question]})
+    task_id = uuid.uuid4().hex
+    future = agent_executor.submit(_run_agent, prompt)
+    with agent_tasks_lock:
+        _evict_stale_agent_tasks()
+        agent_tasks[task_id] = (future, time.monotonic())
 
-        # Extract non-empty AIMessage content (summary)
-        ai_contents = [
-            msg.content for msg in agent_response["messages"]
-            if msg.__class__.__name__ == "AIMessage" and msg.content.strip() != ""
-        ]
-        agent_summary = ai_contents[0] if ai_contents else ""
-    except Exception as e:
-        agent_summary = {"error": str(e)}
+    return jsonify({'ok': True, 'task_id': task_id})
+
+@app.route('/api/agent/result/<task_id>', methods=['GET'])
+def get_agent_result(task_id):
+    with agent_tasks_lock:
+        _evict_stale_agent_tasks()
+        task = agent_tasks.get(task_id)
+        if task is None:
+            return jsonify({'error': 'Unknown task'}), 404
+
+        future, _ = task
+        if not future.done():
+            return jsonify({'ok': True, 'done': False})
+
+        del agent_tasks[task_id]
 
-    return jsonify({'ok': True, 'response': agent_summary})
+    return jsonify({'ok': True, 'done': True, 'response': future.result()})
 
 if __name__ == '__main__':
     # Initialize agent in main
@@ -170,5 +259,5 @@ if __name__ == '__main__':
     if not DEMO_MODE:
         build_index(DEMO_PATH)
 
-    # Start Flask app
-    app.run(debug=True, port=5000)
+    # Start Flask app behind a multi-threaded WSGI server, so slow agent calls don't block search and file requests
+    serve(app, host='127.0.0.1', port=5000, threads=8)
@@ -40,53 +40,74 @@ def non_max_suppression(boxes, iou_threshold=0.3, keep_smallest=True):
     """
     Remove overlapping bounding boxes using Non-Maximum Suppression.
     Keeps smaller boxes when there's significant overlap (or larger boxes if keep_smallest is False).
+    The IoU of each kept box against all remaining boxes is computed in one vectorized step.
     """
     if len(boxes) == 0:
         return []
     
+    boxes_arr = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    x1, y1 = boxes_arr[:, 0], boxes_arr[:, 1]
+    x2, y2 = x1 + boxes_arr[:, 2], y1 + boxes_arr[:, 3]
+    areas = boxes_arr[:, 2] * boxes_arr[:, 3]
+
     # Sort by area (smallest first if keep_smallest is True, largest first otherwise)
-    boxes_with_area = [(box, box[2] * box[3]) for box in boxes]
-    boxes_with_area.sort(key=lambda x: x[1], reverse=not keep_smallest)
+    order = np.argsort(areas if keep_smallest else -areas, kind='stable')
     
     keep = []
-    while boxes_with_area:
-        current_box, _ = boxes_with_area.pop(0)
-        keep.append(current_box)
-        
+    while order.size > 0:
+        i = order[0]
+        keep.append(boxes[i])
+        rest = order[1:]
+
+        # Intersection of the current box with every remaining box
+        inter_w = np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])
+        inter_h = np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])
+        intersection = np.where((inter_w >= 0) & (inter_h >= 0), inter_w * inter_h, 0)
+        union = areas[i] + areas[rest] - intersection
+        iou = np.divide(intersection, union, out=np.zeros(len(rest)), where=union > 0)
+
         # Remove boxes that overlap significantly with current box
-        boxes_with_area = [
-            (box, area) for box, area in boxes_with_area
-            if calculate_iou(current_box, box) < iou_threshold
-        ]
+        order = rest[iou < iou_threshold]
     
     return keep
 
-def is_likely_text_box(region, gray_img, x, y, w, h):
+def _box_sum(integral, x, y, w, h):
+    """
+    Sum of the pixels in the box (x, y, w, h), from a summed-area table as returned by cv2.integral.
+    """
+    return integral[y + h, x + w] - integral[y, x + w] - integral[y + h, x] + integral[y, x]
+
+def _to_host(mat):
+    """numpy array of mat, downloading it if it is a cv2.UMat"""
+    return mat.get() if isinstance(mat, cv2.UMat) else mat
+
+def is_likely_text_box(edge_integral, gray_img, x, y, w, h):
     """
     Determine if a region is likely to be a text box/ad rather than an image.
     Text boxes typically have:
     - Higher edge density (lots of fine edges from text)
     - More uniform intensity distribution
     - Horizontal line patterns (text lines)
+    edge_integral: summed-area table of the whole image's (0/1) Canny edges, so the ROI's edge statistics are table lookups
     """
     # Extract the region
     roi = gray_img[y:y+h, x:x+w]
     
     # 1. Check edge density (text has many fine edges)
-    edges = cv2.Canny(roi, 50, 150)
-    edge_density = np.sum(edges > 0) / (w * h)
+    edge_density = _box_sum(edge_integral, x, y, w, h) / (w * h)
     
     # 2. Check for horizontal line patterns (text lines)
-    # Use horizontal morphological operation
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (w // 4, 1))
-    horizontal_lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, horizontal_kernel)
-    horizontal_line_density = np.sum(horizontal_lines > 0) / (w * h)
+    # Fraction of the ROI's rows with edges over more than a quarter of its width, from the per-row edge counts
+    row_prefix = edge_integral[y:y + h + 1, x + w] - edge_integral[y:y + h + 1, x]
+    row_edge_counts = np.diff(row_prefix)
+    horizontal_line_density = np.count_nonzero(row_edge_counts > w / 4) / h
     
     # 3. Check variance (images typically have higher variance)
-    variance = np.var(roi)
-    
     # 4. Check if region is mostly white/empty (borders of ad boxes)
-    mean_intensity = np.mean(roi)
+    # (both from one pass over the ROI)
+    mean, stddev = cv2.meanStdDev(roi)
+    mean_intensity = mean[0, 0]
+    variance = stddev[0, 0] ** 2
     
     # Heuristics for text detection:
     # High edge density + horizontal lines + low variance = likely text
@@ -133,12 +154,15 @@ def detect_images(img_path,
     if img is None:
         raise ValueError(f"Could not read image: {img_path}")
     
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # when OpenCL is available, the whole-page filters run on the GPU through OpenCV's transparent API;
+    # the ROI statistics below use the host copy of gray
+    gray_device = cv2.cvtColor(cv2.UMat(img) if cv2.ocl.useOpenCL() else img, cv2.COLOR_BGR2GRAY)
+    gray = _to_host(gray_device)
     img_area = gray.shape[0] * gray.shape[1]
     max_area = img_area * max_area_ratio
     
     # Basic thresholding and contour detection
-    _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, binary = cv2.threshold(gray_device, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
     contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
     # Filter by size and aspect ratio
@@ -158,20 +182,24 @@ def detect_images(img_path,
     boxes = non_max_suppression(boxes, iou_threshold=iou_threshold)
 
     if filter_text_boxes:
+        # run Canny once on the whole page, so each box's edge count is a summed-area table lookup
+        edges_full = _to_host(cv2.Canny(gray_device, 50, 150))
+        edge_integral = cv2.integral((edges_full > 0).astype(np.uint8))
+
         filtered_boxes = []
         for x, y, w, h in boxes:
-            roi = gray[y:y+h, x:x+w]
-            if not is_likely_text_box(roi, gray, x, y, w, h):
+            if not is_likely_text_box(edge_integral, gray, x, y, w, h):
                 filtered_boxes.append((x, y, w, h))
         
         boxes = filtered_boxes
     
 
     # filter out images with too high proportion of white pixels (likely false positive, or text only)
+    # (white pixel counts come from one summed-area table instead of a threshold + sum per box)
+    white_integral = cv2.integral((gray > 180).astype(np.uint8))
     final_boxes = []
     for x, y, w, h in boxes[:]:
-        roi = gray[y:y+h, x:x+w]
-        num_white = np.sum(roi > 180)
+        num_white = _box_sum(white_integral, x, y, w, h)
         num_white_ratio = num_white / (w * h)
         if num_white_ratio > 0.5:
             continue
@@ -227,7 +255,7 @@ def extract_images_from_document(img_path: str) -> List[Image.Image]:
 
 def run_tests():
     import os
-    from search import extract_file_paths
+    from utils import extract_file_paths
     test_data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests", "data")
     filepaths = extract_file_paths(test_data_dir, ('jpg',))
 
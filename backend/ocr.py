@@ -1,23 +1,66 @@
 # ocr_service.py
-from typing import List
+from typing import List, Optional
 from PIL import Image
+from concurrent.futures import Executor, ProcessPoolExecutor
+import threading
 
 import pytesseract
+import os
 import re
 
-from utils import is_image_path
+from utils import is_image_path, file_sha1
+
+# OCR text of image files, keyed by the hash of their contents
+# (kept out of the indexed directories, where a .recollect folder marks a saved index)
+OCR_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'recollect', 'ocr')
+
+_ocr_executor = None
+_ocr_executor_lock = threading.Lock()
+
+def _init_ocr_worker():
+    # each worker runs one Tesseract at a time; keep it single-threaded so cpu_count workers don't oversubscribe the cores
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def get_ocr_executor() -> Executor:
+    """
+    Get the process pool used for OCR; it is created on first use and reused for the lifetime of the process,
+    so repeated indexing (e.g. one set-path call per directory) does not pay for starting new workers each time.
+    """
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            _ocr_executor = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_ocr_worker)
+        return _ocr_executor
+
+def _ocr_cache_path(image_path: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, file_sha1(image_path) + '.txt')
 
 def run_ocr(image_path: str) -> str:
     """
     Run OCR on a document image using Tesseract.
+    The text is cached on disk by file contents, so unchanged images are only OCRed once.
     """
     try:
+        cache_path = _ocr_cache_path(image_path)
+        if os.path.exists(cache_path):
+            with open(cache_path, encoding='utf-8') as f:
+                return f.read()
         image = Image.open(image_path).convert("RGB")
-        text = pytesseract.image_to_string(image)
-        return text.strip()
+        text = pytesseract.image_to_string(image).strip()
     except Exception as e:
         print(f"OCR failed for {image_path}: {e}")
         return ''
+    if text:
+        # write to a temporary file first so that concurrent readers never see a partial entry
+        try:
+            os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not cache OCR text for {image_path}: {e}")
+    return text
 
 def extract_chunks(path: str) -> List[str]:
     """
@@ -33,6 +76,35 @@ def extract_chunks(path: str) -> List[str]:
 
     return ocr_to_chunks(text, max_words=250)
 
+def _extract_chunks_safe(path: str) -> Optional[List[str]]:
+    """
+    extract_chunks that returns None on failure, so that one bad file does not fail a whole batch
+    """
+    try:
+        return extract_chunks(path)
+    except Exception as e:
+        print(f"Chunk extraction failed for {path}: {e}")
+        return None
+
+def extract_chunks_parallel(paths: List[str], executor: Optional[Executor] = None) -> List[Optional[List[str]]]:
+    """
+    Get the list of chunks for each document file in paths, running the OCR of image files on executor.
+    Results are in the same order as paths; files whose extraction failed get None.
+    Only images are sent to the executor, other files are read inline.
+    """
+    image_paths = [path for path in paths if is_image_path(path)]
+    if executor is not None and len(image_paths) > 1:
+        ocr_chunks = dict(zip(image_paths, executor.map(_extract_chunks_safe, image_paths)))
+    else:
+        ocr_chunks = {path: _extract_chunks_safe(path) for path in image_paths}
+
+    return [ocr_chunks[path] if path in ocr_chunks else _extract_chunks_safe(path) for path in paths]
+
+_SPLIT_HYPHEN_NEWLINE_RE = re.compile(r"(\w)-\n(\w)")
+_SPLIT_HYPHEN_SPACE_RE = re.compile(r"(\w)-\s+(\w)")
+_MULTI_NEWLINE_RE = re.compile(r"\n{2,}")
+_INDENT_RE = re.compile(r"[ \t]+")
+
 def clean_ocr_text(text: str) -> str:
     """Normalize common OCR artifacts."""
 
@@ -42,16 +114,16 @@ def clean_ocr_text(text: str) -> str:
     text = text.replace("–", "-").replace("—", "-")
 
     # Fix common OCR split-hyphen line breaks ("ad-\nvanced" -> "advanced")
-    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = _SPLIT_HYPHEN_NEWLINE_RE.sub(r"\1\2", text)
 
     # Remove hyphens before spaces (e.g., "men ad- vanced")
-    text = re.sub(r"(\w)-\s+(\w)", r"\1 \2", text)
+    text = _SPLIT_HYPHEN_SPACE_RE.sub(r"\1 \2", text)
 
     # Reduce multiple newlines to paragraph breaks
-    text = re.sub(r"\n{2,}", "\n\n", text)
+    text = _MULTI_NEWLINE_RE.sub("\n\n", text)
 
     # Strip weird indentation
-    text = re.sub(r"[ \t]+", " ", text)
+    text = _INDENT_RE.sub(" ", text)
 
     return text.strip()
 
@@ -89,7 +161,7 @@ def ocr_to_chunks(text: str, max_words=250) -> List[str]:
 
 def run_tests():
     import os
-    from search import extract_file_paths
+    from utils import extract_file_paths
     test_data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests", "data", "The_Rensselaer_Polytechnic:_April_1,_1957")
     filepaths = extract_file_paths(test_data_dir, ('jpg',))
 
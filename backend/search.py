@@ -1,29 +1,70 @@
 from anyio import Path
 from sentence_transformers import SentenceTransformer, util
+import torch
+import functools
 import os
+import struct
+import threading
 import numpy as np
-from typing import List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple, Union
 from PIL import Image
 
+try:
+    # optional: SIMD dot-product kernels, faster than BLAS for scoring one query against many small rows
+    import simsimd
+except ImportError:
+    simsimd = None
 
-from ocr import extract_chunks
+
+from ocr import extract_chunks, extract_chunks_parallel, get_ocr_executor
 from image_utils import extract_images_from_document
-from utils import is_image_path
+from utils import is_image_path, file_sha1, extract_file_paths
+
+
+TEXT_MODEL_NAME = 'all-MiniLM-L6-v2'
+IMAGE_MODEL_NAME = "clip-ViT-B-32"
+
+def _embedding_device() -> str:
+    if torch.cuda.is_available():
+        return 'cuda'
+    if torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+device = _embedding_device()
 
+@functools.cache
+def _load_model(name: str) -> SentenceTransformer:
+    model = SentenceTransformer(name).to(device)
+    if device != 'cpu':
+        # FP16 inference on GPU/MPS; embeddings are still returned and stored as float32
+        model = model.half()
+    return model
 
-text_model = SentenceTransformer('all-MiniLM-L6-v2')
-image_model = SentenceTransformer("clip-ViT-B-32")
+# the models are only loaded on first use, e.g. file walks and cached-index loads never load CLIP;
+# the lock keeps concurrent first calls (from server threads) from loading a model twice
+_model_lock = threading.Lock()
 
-text_model = text_model.to('cpu')
-image_model = image_model.to('cpu')
+def _text_model() -> SentenceTransformer:
+    with _model_lock:
+        return _load_model(TEXT_MODEL_NAME)
+
+def _image_model() -> SentenceTransformer:
+    with _model_lock:
+        return _load_model(IMAGE_MODEL_NAME)
 
 class Document:
-    def __init__(self, path: str, text_embeddings: Optional[List[np.ndarray]]=None, image_embeddings: Optional[List[np.ndarray]]=None):
+    def __init__(self, path: str, text_embeddings: Optional[np.ndarray]=None, image_embeddings: Optional[List[np.ndarray]]=None):
+        """
+        text_embeddings: (num_chunks, dim) array, or list of per-chunk embeddings
+        """
         self.path = path
 
-        if text_embeddings or image_embeddings is not None:
-            self.text_embeddings = text_embeddings or []
-            self.image_embeddings = image_embeddings or []
+        if text_embeddings is not None or image_embeddings is not None:
+            self.text_embeddings = text_embeddings if text_embeddings is not None else []
+            self.image_embeddings = image_embeddings if image_embeddings is not None else []
             return
         
         text_embeddings, image_embeddings = compute_document_embeddings(path)
@@ -37,123 +78,395 @@ class Document:
         return self.__str__()
 
 def compute_text_embedding(text: str) -> np.ndarray:
-    embedding = text_model.encode(text, convert_to_tensor=True).cpu().numpy()
+    embedding = compute_text_embeddings([[text]])[0][0]
     return embedding
 
 def compute_image_embedding(img: Optional[Image.Image] = None, query: Optional[str] = None) -> np.ndarray:
     if img is not None:
-        return image_model.encode(img, convert_to_tensor=True).cpu().numpy()
+        return _image_model().encode(img, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32, copy=False)
     if query is not None:
-        return image_model.encode(query, convert_to_tensor=True).cpu().numpy()
+        return _image_model().encode(query, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32, copy=False)
     raise ValueError("Either img or query must be provided")
 
-def compute_document_embeddings(path: str) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+# embeddings of the most recently encoded texts, so text repeated across documents (headers, boilerplate) is encoded once
+_text_embeddings_memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_text_embeddings_memo_size = 50_000
+_text_embeddings_memo_lock = threading.Lock()
+
+def compute_text_embeddings(chunks_per_document: List[List[str]]) -> List[Union[np.ndarray, List]]:
     """
-    returns a list of embeddings for the sentences in the document
+    encodes the text chunks of several documents in one batched call and returns one (num_chunks, dim) array per document
+    (or an empty list per document when there are no chunks at all)
+    (only chunks that were not encoded recently are passed to the model)
     """
-    chunks = extract_chunks(path)
-    text_embeddings = [compute_text_embedding(chunk) for chunk in chunks]
-    if is_image_path(path):
-        images = extract_images_from_document(path)
-        image_embeddings = [compute_image_embedding(img) for img in images]
-    else:
-        image_embeddings = []
-    return text_embeddings, image_embeddings
+    all_chunks = [chunk for chunks in chunks_per_document for chunk in chunks]
+    if len(all_chunks) == 0:
+        # nothing to embed, so don't load the model just for its dimension
+        return [[] for _ in chunks_per_document]
+
+    known = {}
+    with _text_embeddings_memo_lock:
+        for chunk in all_chunks:
+            if chunk in _text_embeddings_memo:
+                _text_embeddings_memo.move_to_end(chunk)
+                known[chunk] = _text_embeddings_memo[chunk]
+
+    missing = list(dict.fromkeys(chunk for chunk in all_chunks if chunk not in known))
+    if len(missing) > 0:
+        encoded = _text_model().encode(missing, batch_size=64, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False).astype(np.float32, copy=False)
+        with _text_embeddings_memo_lock:
+            for chunk, embedding in zip(missing, encoded):
+                # copied so the memo does not keep whole batches alive
+                known[chunk] = _text_embeddings_memo[chunk] = embedding.copy()
+            while len(_text_embeddings_memo) > _text_embeddings_memo_size:
+                _text_embeddings_memo.popitem(last=False)
+
+    embeddings = np.stack([known[chunk] for chunk in all_chunks])
+    return np.split(embeddings, np.cumsum([len(chunks) for chunks in chunks_per_document])[:-1])
+
+def compute_document_image_embeddings(path: str) -> List[np.ndarray]:
+    if not is_image_path(path):
+        return []
+    images = extract_images_from_document(path)
+    if len(images) == 0:
+        return []
+    # encode all detected images in one batched call
+    embeddings = _image_model().encode(images, batch_size=16, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+    return list(embeddings.astype(np.float32, copy=False))
+
+def compute_document_embeddings(path: str, chunks: Optional[List[str]] = None) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    returns the embeddings for the text chunks of the document (as one (num_chunks, dim) array) and for its images
+    chunks: the already extracted text chunks of the document, if available (otherwise they are extracted from path)
+    """
+    if chunks is None:
+        chunks = extract_chunks(path)
+    return compute_text_embeddings([chunks])[0], compute_document_image_embeddings(path)
 
 def compute_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
-    return np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
+    # embeddings are unit length (the models normalize them when encoding), so cosine similarity is the dot product
+    return float(np.dot(embedding1, embedding2))
 
-def search_documents(query: str, documents: List[Document], top_k: int=5, image_weight: float=1.5) -> List[Document]:
+def _stack_embeddings(embeddings_per_doc: List) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """
+    Stack the embeddings of every document into one float32 matrix (the embeddings are already unit length).
+    Embeddings that are already consecutive rows of one matrix, like those read from one cache file, are used in place.
+    returns (matrix, counts) where counts[i] is the number of matrix rows belonging to document i; matrix is None if there are no rows
+    """
+    counts = np.array([len(embeddings) for embeddings in embeddings_per_doc], dtype=np.int64)
+    if counts.sum() == 0:
+        return None, counts
+
+    matrix = _consecutive_rows(embeddings_per_doc)
+    if matrix is not None:
+        return matrix, counts
+    matrix = np.concatenate([np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1) for embeddings in embeddings_per_doc if len(embeddings) > 0])
+    return matrix, counts
+
+def _root_base(array: np.ndarray):
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array.base if array.base is not None else array
+
+def _consecutive_rows(embeddings_per_doc: List) -> Optional[np.ndarray]:
+    """
+    If the embeddings are consecutive float32 rows of one matrix (as when all documents come from one cache file),
+    returns the span of that matrix they cover without copying it; otherwise None
+    """
+    pieces = []
+    for embeddings in embeddings_per_doc:
+        if isinstance(embeddings, np.ndarray):
+            pieces.append(embeddings)
+        else:
+            pieces += embeddings
+    if not all(isinstance(piece, np.ndarray) and piece.dtype == np.float32 and piece.ndim in (1, 2) and piece.flags.c_contiguous for piece in pieces):
+        return None
+    pieces = [piece.reshape(-1, piece.shape[-1]) for piece in pieces if piece.size > 0]
+    first = pieces[0]
+    root = _root_base(first)
+    for previous, piece in zip(pieces, pieces[1:]):
+        if piece.shape[1] != first.shape[1] or _root_base(piece) is not root or piece.ctypes.data != previous.ctypes.data + previous.nbytes:
+            return None
+    return np.lib.stride_tricks.as_strided(first, shape=(sum(len(piece) for piece in pieces), first.shape[1]), writeable=False)
+
+def _quantize_matrix(matrix: np.ndarray, quantization: Optional[str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    returns (matrix in the given in-memory format, per-row scales or None): None keeps float32, "fp16" halves it,
+    and "int8" quantizes every row with its own scale (see quantize_int8)
+    """
+    if quantization is None:
+        return matrix, None
+    if quantization == "fp16":
+        return matrix.astype(np.float16), None
+    if quantization == "int8":
+        return quantize_int8(matrix)
+    raise ValueError(f"Unsupported quantization: {quantization}")
+
+# rows per tile when scoring fp16 / int8 matrices without simsimd (1024 x 384 float32 is 1.5 MB, about an L2 cache)
+_SCORE_TILE_ROWS = 1024
+
+def _dot_scores(matrix: np.ndarray, query: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    dot product of every row of matrix with query; query is converted to the format of matrix (see _quantize_matrix),
+    scales are the per-row scales of an int8 matrix
+    """
+    query = np.asarray(query, dtype=np.float32)[None, :]
+    if matrix.dtype == np.int8:
+        query, query_scale = quantize_int8(query)
+        scales = scales * query_scale[0]
+    else:
+        query = query.astype(matrix.dtype, copy=False)
+    if matrix.dtype == np.float32:
+        # BLAS matrix-vector product, faster than simsimd for float32
+        scores = matrix @ query[0]
+    elif simsimd is not None:
+        # typed kernels run directly on fp16 / int8 rows
+        scores = np.asarray(simsimd.cdist(query, matrix, metric='dot')).ravel()
+    else:
+        # NumPy has no fast fp16 / int8 matrix products, so compute in float32 (exact for the int8 products),
+        # upcasting one cache-sized tile of rows at a time rather than copying the whole matrix per query
+        query = query[0].astype(np.float32)
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _SCORE_TILE_ROWS):
+            scores[start:start + _SCORE_TILE_ROWS] = matrix[start:start + _SCORE_TILE_ROWS].astype(np.float32) @ query
+    return scores * scales if scales is not None else scores
+
+def _per_document_max(scores: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    returns the maximum of each document's segment of scores (-inf for documents with no rows)
+    """
+    doc_max = np.full(len(counts), -np.inf)
+    nonempty = counts > 0
+    if nonempty.any():
+        starts = np.cumsum(counts) - counts
+        doc_max[nonempty] = np.maximum.reduceat(scores, starts[nonempty])
+    return doc_max
+
+def _to_gpu(matrix: Optional[np.ndarray], counts: np.ndarray) -> Tuple[Optional[torch.Tensor], Optional[torch.Tensor]]:
+    """
+    returns (matrix, document index of each row) as CUDA tensors, or (None, None) without CUDA or for int8 matrices
+    """
+    if matrix is None or device != 'cuda' or matrix.dtype == np.int8:
+        return None, None
+    owners = np.repeat(np.arange(len(counts)), counts)
+    return torch.from_numpy(matrix).to(device), torch.from_numpy(owners).to(device)
+
+class DocumentIndex:
+    def __init__(self, documents: List[Document], quantization: Optional[str] = None):
+        """
+        documents with their embeddings stacked once into matrices (one per model), for search_documents;
+        otherwise it behaves as the (read-only) list of documents
+        quantization: None to keep the matrices as float32, or "fp16" / "int8" for 2x / 4x less memory to hold and scan
+        """
+        self.documents = list(documents)
+        text_matrix, self.text_counts = _stack_embeddings([doc.text_embeddings for doc in self.documents])
+        image_matrix, self.image_counts = _stack_embeddings([doc.image_embeddings for doc in self.documents])
+        self.text_matrix, self.text_scales = _quantize_matrix(text_matrix, quantization) if text_matrix is not None else (None, None)
+        self.image_matrix, self.image_scales = _quantize_matrix(image_matrix, quantization) if image_matrix is not None else (None, None)
+
+        if quantization is None:
+            # the documents keep row views of the stacked matrices rather than their own copies of the same embeddings
+            for doc, text_start, text_count, image_start, image_count in zip(self.documents, np.cumsum(self.text_counts) - self.text_counts, self.text_counts, np.cumsum(self.image_counts) - self.image_counts, self.image_counts):
+                if text_count > 0:
+                    doc.text_embeddings = self.text_matrix[text_start:text_start + text_count]
+                if image_count > 0:
+                    doc.image_embeddings = list(self.image_matrix[image_start:image_start + image_count])
+
+        # on CUDA, the (float) matrices are also kept on the GPU with the document of each row, so searches run there
+        # without copying the corpus to the device per query; only the per-document scores come back
+        self.text_matrix_gpu, self.text_owners_gpu = _to_gpu(self.text_matrix, self.text_counts)
+        self.image_matrix_gpu, self.image_owners_gpu = _to_gpu(self.image_matrix, self.image_counts)
+
+    def max_scores(self, kind: str, query: np.ndarray) -> np.ndarray:
+        """
+        returns the maximum similarity of query to each document's "text" or "image" embeddings (-inf for documents with none)
+        """
+        matrix_gpu = getattr(self, f"{kind}_matrix_gpu")
+        if matrix_gpu is not None:
+            query_gpu = torch.from_numpy(query).to(device, dtype=matrix_gpu.dtype)
+            doc_max = torch.full((len(self.documents),), float('-inf'), device=device)
+            doc_max.scatter_reduce_(0, getattr(self, f"{kind}_owners_gpu"), (matrix_gpu @ query_gpu).float(), reduce='amax')
+            return doc_max.cpu().numpy()
+        scores = _dot_scores(getattr(self, f"{kind}_matrix"), query, getattr(self, f"{kind}_scales"))
+        return _per_document_max(scores, getattr(self, f"{kind}_counts"))
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def __getitem__(self, idx):
+        return self.documents[idx]
+
+    def __repr__(self):
+        return repr(self.documents)
+
+def search_documents(query: str, documents: Union[DocumentIndex, List[Document]], top_k: int=5, image_weight: float=1.5) -> List[Document]:
     """
     return the top_k most relevant documents to the query
+    documents: a DocumentIndex, or a list of documents (which is then stacked for this search only)
     image_weight: weight multiplier for image embeddings similarity (useful as images use a different embedding and similarity scale is slightly different)
     """
-    query_embedding = compute_text_embedding(query)
-    query_img_embedding = compute_image_embedding(query)
-    similarities = []
+    if len(documents) == 0 or top_k <= 0:
+        return []
+    index = documents if isinstance(documents, DocumentIndex) else DocumentIndex(documents)
 
-    for idx, doc in enumerate(documents):
-        if len(doc.text_embeddings) == 0 and len(doc.image_embeddings) == 0:
-            continue
-        # Save maximum similarity across all embeddings in the document
-        doc_similarities = [compute_similarity(query_embedding, emb) for emb in doc.text_embeddings]
-        doc_similarities += [image_weight * compute_similarity(query_img_embedding, emb) for emb in doc.image_embeddings]
-        similarities.append((max(doc_similarities), idx))
+    # Save maximum similarity across all embeddings in the document, scoring all embeddings with one matrix product
+    # (query and document embeddings are unit length, so the dot products are the cosine similarities)
+    scores = np.full(len(index), -np.inf)
 
-    # Sort documents by similarity score in descending order
-    similarities.sort(key=lambda x: x[0], reverse=True)
+    if index.text_matrix is not None:
+        query_embedding = compute_text_embedding(query)
+        scores = np.maximum(scores, index.max_scores("text", query_embedding))
 
-    # Return top_k documents
-    top_documents = [documents[idx] for _, idx in similarities[:top_k]]
-    return top_documents
+    if index.image_matrix is not None:
+        query_img_embedding = compute_image_embedding(query=query)
+        scores = np.maximum(scores, image_weight * index.max_scores("image", query_img_embedding))
 
-def extract_file_paths(dir_path: str, types: Tuple[str]) -> List[str]:
-    file_paths = []
-    for filename in os.listdir(dir_path):
+    # documents without any embeddings are skipped
+    candidates = np.flatnonzero(np.isfinite(scores))
 
-        if filename == '.recollect':
-            continue
+    # select the top_k without sorting every document, then sort only those by similarity score in descending order
+    if len(candidates) > top_k:
+        candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
 
-        if '.' in filename and filename.split('.')[-1].lower() in types and not os.path.isdir(os.path.join(dir_path, filename)):
-            file_paths.append(os.path.join(dir_path, filename))
+    return [index[idx] for idx in candidates]
 
-        elif os.path.isdir(os.path.join(dir_path, filename)):
-            sub_dir_paths = extract_file_paths(os.path.join(dir_path, filename), types)
-            file_paths.extend(sub_dir_paths)
+# bumped whenever the on-disk layout of .recollect caches changes; caches of other versions are rebuilt
+CACHE_VERSION = 5
+# a cache is one file: INDEX_MAGIC, the version and the length of a JSON header (uint32 each), the header, then the
+# embedding matrices of all its documents (stacked in document order, one per model) at the offsets the header lists
+INDEX_FILE = "index.bin"
+INDEX_MAGIC = b"RECOLLCT"
+_INDEX_PREAMBLE = struct.Struct("<8sII")
+_INDEX_ALIGNMENT = 64
 
-    return file_paths
+def quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    symmetric int8 quantization of the rows of embeddings; returns (quantized rows, per-row float32 scales)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.abs(embeddings).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.round(embeddings / scales[:, None]).astype(np.int8), scales.astype(np.float32)
 
-def _save_index_to_cache(cache_path: str, documents: List[Document], child_cache_paths: Optional[List[str]] = None):
-    os.makedirs(cache_path, exist_ok=True)
+def dequantize_int8(quantized: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return quantized.astype(np.float32) * scales[:, None]
 
-    index_data = {"documents": [], "children": child_cache_paths or []}
-    for i, doc in enumerate(documents):
-        text_embedding_path = f"doc_{i}_tembeddings.npz"
-        img_embedding_path = f"doc_{i}_iembeddings.npz"
+def _save_index_to_cache(cache_path: str, documents: List[Document], child_cache_paths: Optional[List[str]] = None, quantization: Optional[str] = None):
+    """
+    quantization: None to store float32 embeddings, or "int8" to store them as int8 with per-embedding scales (4x smaller on disk)
+    """
+    if quantization not in (None, "int8"):
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    os.makedirs(cache_path, exist_ok=True)
 
-        if len(doc.text_embeddings) > 0:
-            np.savez(os.path.join(cache_path, text_embedding_path), *doc.text_embeddings)
-        
-        if len(doc.image_embeddings) > 0:
-            np.savez(os.path.join(cache_path, img_embedding_path), *doc.image_embeddings)
+    arrays = {}
+    for kind in ("text", "image"):
+        matrix, _ = _stack_embeddings([getattr(doc, f"{kind}_embeddings") for doc in documents])
+        if matrix is None:
+            continue
+        if quantization == "int8":
+            matrix, arrays[f"{kind}_scales"] = quantize_int8(matrix)
+        arrays[kind] = matrix
+
+    # lay the matrices out after the header, each aligned so it can be viewed in place from a memory map
+    header = {"quantization": quantization, "children": child_cache_paths or [], "documents": [
+        {"path": doc.path, "num_text_embeddings": len(doc.text_embeddings), "num_image_embeddings": len(doc.image_embeddings)}
+        for doc in documents
+    ], "arrays": {}}
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"offset": offset, "shape": array.shape, "dtype": array.dtype.str}
+        offset += -(-array.nbytes // _INDEX_ALIGNMENT) * _INDEX_ALIGNMENT
+    import json
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(_INDEX_PREAMBLE.size + len(header_bytes)) // _INDEX_ALIGNMENT) * _INDEX_ALIGNMENT
+
+    # write to a temporary file and swap it in, so processes that memory-mapped the old file keep a valid mapping
+    index_path = os.path.join(cache_path, INDEX_FILE)
+    tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_INDEX_PREAMBLE.pack(INDEX_MAGIC, CACHE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, index_path)
+
+    # remove the files of a cache written in a previous layout
+    for file in os.listdir(cache_path):
+        if file in ("index.json", "embeddings.npz", "text_embeddings.npy", "image_embeddings.npy", "scales_text_embeddings.npy", "scales_image_embeddings.npy") or (file.startswith("doc_") and file.endswith("embeddings.npz")):
+            os.remove(os.path.join(cache_path, file))
 
-        index_data["documents"].append({
-            "path": doc.path,
-            "text_embeddings_file": text_embedding_path if len(doc.text_embeddings) > 0 else None,
-            "image_embeddings_file": img_embedding_path if len(doc.image_embeddings) > 0 else None
-        })
+    return cache_path
 
-    with open(os.path.join(cache_path, "index.json"), "w") as f:
-        import json
-        json.dump(index_data, f)
+# cache_path -> (mtime of its index file, child cache paths, documents stored directly in that cache)
+_index_cache: Dict[str, Tuple[float, List[str], List[Document]]] = {}
+_index_cache_lock = threading.RLock()
 
-    return cache_path
+def _read_cached_index(cache_path: str) -> Tuple[List[str], List[Document]]:
+    """
+    returns (child_cache_paths, documents) read from the .recollect cache at cache_path, not including the documents of its children
+    """
+    import json
+    index_path = os.path.join(cache_path, INDEX_FILE)
+    with open(index_path, "rb") as f:
+        magic, version, header_len = _INDEX_PREAMBLE.unpack(f.read(_INDEX_PREAMBLE.size))
+        if magic != INDEX_MAGIC or version != CACHE_VERSION:
+            raise ValueError(f"Cache at {cache_path} has version {version}, expected {CACHE_VERSION}")
+        header = json.loads(f.read(header_len))
+    data_start = -(-(_INDEX_PREAMBLE.size + header_len) // _INDEX_ALIGNMENT) * _INDEX_ALIGNMENT
+
+    # the matrices are views into one read-only memory map of the file, so rows are only read from disk once they are used
+    mapped = np.memmap(index_path, dtype=np.uint8, mode='r') if header["arrays"] else None
+    def array(name: str) -> np.ndarray:
+        spec = header["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        start = data_start + spec["offset"]
+        return mapped[start:start + dtype.itemsize * int(np.prod(spec["shape"]))].view(dtype).reshape(spec["shape"])
+
+    documents = [Document(doc_data["path"], text_embeddings=[], image_embeddings=[]) for doc_data in header["documents"]]
+    for kind in ("text", "image"):
+        if kind not in header["arrays"]:
+            continue
+        if header["quantization"] == "int8":
+            # searched in float32
+            matrix = dequantize_int8(array(kind), array(f"{kind}_scales"))
+        else:
+            matrix = array(kind)
+        counts = np.array([doc_data[f"num_{kind}_embeddings"] for doc_data in header["documents"]], dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        for doc, start, count in zip(documents, starts, counts):
+            if count > 0:
+                embeddings = matrix[start:start + count]
+                if kind == "text":
+                    doc.text_embeddings = embeddings
+                else:
+                    doc.image_embeddings = list(embeddings)
+
+    return header["children"], documents
 
 def _load_cached_index(cache_path: str) -> List[Document]:
-    import json
+    """
+    Load the documents of the .recollect cache at cache_path and its children.
+    Each cache is only read from disk again if its index file changed since it was last loaded in this process.
+    """
     try:
-        with open(os.path.join(cache_path, "index.json"), "r") as f:
-            index_data = json.load(f)
-        
+        mtime = os.path.getmtime(os.path.join(cache_path, INDEX_FILE))
+        with _index_cache_lock:
+            entry = _index_cache.get(cache_path)
+            if entry is None or entry[0] != mtime:
+                entry = (mtime, *_read_cached_index(cache_path))
+                _index_cache[cache_path] = entry
+        _, children, own_documents = entry
+
         documents = []
-        for child_cache_path in index_data["children"]:
+        for child_cache_path in children:
             documents += _load_cached_index(child_cache_path)
-
-        for doc_data in index_data["documents"]:
-            text_embeddings = []
-            image_embeddings = []
-            if doc_data["text_embeddings_file"] is not None:
-                text_emb_file = os.path.join(cache_path, doc_data["text_embeddings_file"])
-                loaded = np.load(text_emb_file)
-                text_embeddings = [loaded[key] for key in loaded]
-
-            if doc_data["image_embeddings_file"] is not None:
-                img_emb_file = os.path.join(cache_path, doc_data["image_embeddings_file"])
-                loaded = np.load(img_emb_file)
-                image_embeddings = [loaded[key] for key in loaded]
-
-            document = Document(doc_data["path"], text_embeddings=text_embeddings, image_embeddings=image_embeddings)
-            documents.append(document)
+        documents += own_documents
 
     except Exception as e:
         print(e)
@@ -162,26 +475,81 @@ def _load_cached_index(cache_path: str) -> List[Document]:
     return documents
 
 
-def _create_index_recursive(dir_path: str, allow_types: Optional[Tuple[str]], use_cache: bool, subcache_threshold: Optional[int]) -> Tuple[List[Document], List[Document], List[str]]:
+# embeddings of every file indexed so far, keyed by the hash of its contents (per pair of models), so an unchanged
+# file is not embedded again when it is moved or renamed or when its directory cache is rebuilt
+EMBEDDING_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'recollect', 'embeddings', f"{TEXT_MODEL_NAME}+{IMAGE_MODEL_NAME}")
+# the most recently used of those, kept in memory
+_file_embeddings_memo: "OrderedDict[str, Tuple[np.ndarray, List[np.ndarray]]]" = OrderedDict()
+_file_embeddings_memo_size = 4096
+_file_embeddings_memo_lock = threading.Lock()
+
+def _remember_file_embeddings(fingerprint: str, embeddings: Tuple[np.ndarray, List[np.ndarray]]):
+    with _file_embeddings_memo_lock:
+        _file_embeddings_memo[fingerprint] = embeddings
+        _file_embeddings_memo.move_to_end(fingerprint)
+        while len(_file_embeddings_memo) > _file_embeddings_memo_size:
+            _file_embeddings_memo.popitem(last=False)
+
+def _get_file_embeddings(fingerprint: str) -> Optional[Tuple[np.ndarray, List[np.ndarray]]]:
+    """
+    returns (text_embeddings, image_embeddings) stored for the file contents with this fingerprint, or None if there are none
+    """
+    with _file_embeddings_memo_lock:
+        if fingerprint in _file_embeddings_memo:
+            _file_embeddings_memo.move_to_end(fingerprint)
+            return _file_embeddings_memo[fingerprint]
+    try:
+        with np.load(os.path.join(EMBEDDING_CACHE_DIR, fingerprint + ".npz")) as loaded:
+            embeddings = (loaded["text"], list(loaded["image"]))
+    except (OSError, KeyError, ValueError):
+        return None
+    _remember_file_embeddings(fingerprint, embeddings)
+    return embeddings
+
+def _put_file_embeddings(fingerprint: str, text_embeddings: np.ndarray, image_embeddings: List[np.ndarray]):
+    _remember_file_embeddings(fingerprint, (text_embeddings, image_embeddings))
+    # write to a temporary file first so that concurrent readers never see a partial entry
+    cache_path = os.path.join(EMBEDDING_CACHE_DIR, fingerprint + ".npz")
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, text=np.asarray(text_embeddings, dtype=np.float32), image=np.asarray(image_embeddings, dtype=np.float32))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not cache embeddings in {cache_path}: {e}")
+
+def _fingerprint(path: str) -> Optional[str]:
+    try:
+        return file_sha1(path)
+    except OSError:
+        return None
+
+def _create_index_recursive(dir_path: str, allow_types: Optional[Tuple[str]], use_cache: bool, subcache_threshold: Optional[int], executor: Optional[Executor] = None, quantization: Optional[str] = None) -> Tuple[List[Document], List[Document], List[str]]:
     """
     returns (cached_documents, uncached_documents, children_cache_paths)
     children_cache_paths is a list of paths to child .recollect caches in subdirectories
+    executor: pool to run the OCR of image files on, shared across the whole recursion
+    quantization: how embeddings are stored in new caches, see _save_index_to_cache
     """
     files = []
     subdirs = []
     try:
-        entries = os.listdir(dir_path)
+        # DirEntry.is_dir reuses the file type from the directory read instead of a stat per entry
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
     except PermissionError:
         return [], [], []
-    
-    for entry in entries:
-        if os.path.isdir(os.path.join(dir_path, entry)):
-            subdirs.append(entry)
-        else:
-            files.append(entry)
 
     if use_cache and ".recollect" in subdirs:
-        return _load_cached_index(os.path.join(dir_path, ".recollect")), [], [os.path.join(dir_path, ".recollect")]
+        cached = _load_cached_index(os.path.join(dir_path, ".recollect"))
+        # an empty result means the cache is missing, outdated or unreadable, so this directory is indexed again
+        if len(cached) > 0:
+            return cached, [], [os.path.join(dir_path, ".recollect")]
         
     # recursively search subdirectories
     uncached = []
@@ -191,18 +559,40 @@ def _create_index_recursive(dir_path: str, allow_types: Optional[Tuple[str]], us
         if sub_dir.startswith("."):
             # skip hidden directories
             continue
-        _cached, _uncached, _children_cache_paths = _create_index_recursive(os.path.join(dir_path, sub_dir), allow_types=allow_types, use_cache=use_cache, subcache_threshold=subcache_threshold)
+        _cached, _uncached, _children_cache_paths = _create_index_recursive(os.path.join(dir_path, sub_dir), allow_types=allow_types, use_cache=use_cache, subcache_threshold=subcache_threshold, executor=executor, quantization=quantization)
         children_cache_paths += _children_cache_paths
         cached += _cached
         uncached += _uncached
 
-    # now index the current directory files
-    for file in files:
-        if '.' in file and not file.startswith('.') and file.split('.')[-1].lower() in allow_types:
-            uncached.append(Document(os.path.join(dir_path, file)))
+    # now index the current directory files, running their OCR in parallel
+    allowed_extensions = frozenset(t.lower() for t in allow_types)
+    file_paths = [os.path.join(dir_path, file) for file in files if not file.startswith('.') and os.path.splitext(file)[1][1:].lower() in allowed_extensions]
+    # files whose contents were embedded before (under any path) reuse those embeddings, skipping their OCR too
+    fingerprints = {file_path: _fingerprint(file_path) if use_cache else None for file_path in file_paths}
+    embeddings = {}
+    for file_path, fingerprint in fingerprints.items():
+        known = _get_file_embeddings(fingerprint) if fingerprint is not None else None
+        if known is not None:
+            embeddings[file_path] = known
+    to_extract = [file_path for file_path in file_paths if file_path not in embeddings]
+
+    # leave failed files out of the index (and its cache) so they are retried on the next indexing
+    extracted = [(file_path, chunks) for file_path, chunks in zip(to_extract, extract_chunks_parallel(to_extract, executor=executor)) if chunks is not None]
+    # embed the chunks of the whole directory together so the text model runs on full batches
+    text_embeddings_per_document = compute_text_embeddings([chunks for _, chunks in extracted]) if any(chunks for _, chunks in extracted) else [[] for _ in extracted]
+    for (file_path, chunks), text_embeddings in zip(extracted, text_embeddings_per_document):
+        embeddings[file_path] = (text_embeddings, compute_document_image_embeddings(file_path))
+        # no text usually means the OCR failed, so like the OCR cache, don't keep it and try again on the next indexing
+        if fingerprints[file_path] is not None and len(chunks) > 0:
+            _put_file_embeddings(fingerprints[file_path], *embeddings[file_path])
+
+    for file_path in file_paths:
+        if file_path in embeddings:
+            text_embeddings, image_embeddings = embeddings[file_path]
+            uncached.append(Document(file_path, text_embeddings=text_embeddings, image_embeddings=image_embeddings))
 
     if subcache_threshold is not None and len(uncached) > subcache_threshold:
-        cache_path = _save_index_to_cache(os.path.join(dir_path, ".recollect"), uncached, child_cache_paths=children_cache_paths)
+        cache_path = _save_index_to_cache(os.path.join(dir_path, ".recollect"), uncached, child_cache_paths=children_cache_paths, quantization=quantization)
         print(f"Cached {len(uncached)} documents to {cache_path}")
         
         # reset children paths to just this, as further children are already referenced in this cache level
@@ -226,20 +616,21 @@ def get_cached_index_only(dir_path: str, allow_types: Optional[Tuple[str]] = ('p
         documents = _load_cached_index(os.path.join(dir_path, '.recollect'))
         return documents
     
-    for entry in os.listdir(dir_path):
-        full_path =  os.path.join(dir_path, entry)
-        if os.path.isdir(full_path) and not entry.startswith('.'):
-            documents += get_cached_index_only(full_path, allow_types=allow_types)
+    with os.scandir(dir_path) as it:
+        subdirs = [entry.path for entry in it if entry.is_dir() and not entry.name.startswith('.')]
+    for full_path in subdirs:
+        documents += get_cached_index_only(full_path, allow_types=allow_types)
             
     return documents
 
 
-def get_index(dir_path: str, allow_types: Optional[Tuple[str]] = ('pdf', 'png', 'jpg', 'txt'), use_cache: bool=True, subcache_threshold: Optional[int]=50, avoid_create: bool = False) -> List[Document]:
+def get_index(dir_path: str, allow_types: Optional[Tuple[str]] = ('pdf', 'png', 'jpg', 'txt'), use_cache: bool=True, subcache_threshold: Optional[int]=50, avoid_create: bool = False, quantization: Optional[str] = None) -> List[Document]:
     """
     Create an index of documents from the specified directory.
     If use_cache is True, this will save the index to a .recollect subdirectory and load from it for faster index creation in future calls.
     If subcache_threshold is set, any directory with more than this number of files will have its own .recollect cache,
     referenced recursively py parent .recollect caches; use subcache_threshold=None to only use a single cache at dir_path level.
+    quantization="int8" stores the embeddings of new caches as int8 (they are dequantized to float32 when loaded).
     """
 
     # check if cached index exists at this level
@@ -251,10 +642,11 @@ def get_index(dir_path: str, allow_types: Optional[Tuple[str]] = ('pdf', 'png',
             return documents
         
     # otherwise, depth-first traverse directories to build index
-    cached_docs, uncached_docs, child_cache_paths = _create_index_recursive(dir_path=dir_path, allow_types=allow_types, use_cache=use_cache, subcache_threshold=subcache_threshold)
+    # OCR runs on the long-lived process pool (workers are only started once there is OCR work)
+    cached_docs, uncached_docs, child_cache_paths = _create_index_recursive(dir_path=dir_path, allow_types=allow_types, use_cache=use_cache, subcache_threshold=subcache_threshold, executor=get_ocr_executor(), quantization=quantization)
 
     if use_cache and len(uncached_docs) > 0:
-        _save_index_to_cache(os.path.join(dir_path, ".recollect"), uncached_docs, child_cache_paths=child_cache_paths)
+        _save_index_to_cache(os.path.join(dir_path, ".recollect"), uncached_docs, child_cache_paths=child_cache_paths, quantization=quantization)
         return cached_docs + uncached_docs
     
     return cached_docs + uncached_docs
@@ -267,6 +659,10 @@ def run_tests():
     for filename in ["construction_project.txt", "dog.txt", "horse.txt", "programmer.txt", "rocket.png", "scene1.png"]:
         assert filename in filenames, f"{filename} not found in extracted file paths"
 
+    # parallel chunk extraction gives the same chunks, in the same order, as serial extraction
+    chunk_paths = extract_file_paths(test_data_dir, ('txt', 'jpg'))
+    assert extract_chunks_parallel(chunk_paths, executor=get_ocr_executor()) == [extract_chunks(fp) for fp in chunk_paths]
+
     documents = get_index(test_data_dir, allow_types=('txt', 'png'), use_cache=False)
 
     query = "A person who writes code"
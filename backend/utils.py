@@ -1,6 +1,30 @@
+import hashlib
+import os
+from typing import Iterator, List, Tuple
 
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif'})
 
 def is_image_path(path: str) -> bool:
     # naive check based on file extension
-    image_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif'}
-    return any(path.lower().endswith(ext) for ext in image_extensions)
\ No newline at end of file
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+def file_sha1(path: str) -> str:
+    """hex SHA-1 of the file contents at path"""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha1').hexdigest()
+
+def _walk_file_paths(dir_path: str, types: frozenset) -> Iterator[str]:
+    # scandir entries carry their file type from the directory read, so no extra stat per entry
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                # skip hidden files and directories, including the .recollect caches
+                continue
+
+            if entry.is_dir():
+                yield from _walk_file_paths(entry.path, types)
+            elif os.path.splitext(entry.name)[1][1:].lower() in types:
+                yield entry.path
+
+def extract_file_paths(dir_path: str, types: Tuple[str]) -> List[str]:
+    return list(_walk_file_paths(dir_path, frozenset(t.lower() for t in types)))
@@ -11,6 +11,9 @@ console.log('Using API_BASE:', API_BASE);
 const IS_DEMO = import.meta.env.VITE_DEMO_MODE === 'true';
 const PATH = import.meta.env.VITE_DEMO_PATH || '';
 
+// agent results are polled once a second, so this is roughly the prompt timeout in seconds
+const MAX_PROMPT_POLL_ATTEMPTS = 300;
+
 const App: React.FC = () => {
   const [directoryPath, setDirectoryPath] = useState(IS_DEMO ? '' : PATH);
   const [browserOpen, setBrowserOpen] = useState(false);
@@ -128,7 +131,18 @@ const App: React.FC = () => {
         body: JSON.stringify({ prompt: q, path: directoryPath }),
       });
       if (!resp.ok) throw new Error('Prompt failed');
-      const data = await resp.json();
+      const { task_id } = await resp.json();
+
+      // the agent runs in the background; poll until its response is ready (or give up)
+      let data;
+      let attempts = 0;
+      do {
+        if (++attempts > MAX_PROMPT_POLL_ATTEMPTS) throw new Error('Prompt timed out');
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const resultResp = await fetch(`${API_BASE}/api/agent/result/${task_id}`);
+        if (!resultResp.ok) throw new Error('Prompt failed');
+        data = await resultResp.json();
+      } while (!data.done);
       log(`AI Summary generated`, 'success');
       removeStatus('Generating AI Summary');
       return data.response || '';
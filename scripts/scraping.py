@@ -6,6 +6,7 @@ from selenium.webdriver.support import expected_conditions as EC
 
 import requests
 import os
+import shutil
 import csv
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -93,22 +94,27 @@ def generate_issue_dictionary():
 
     driver.quit()
 
-def download_page(driver, img_url, local_path, page_num):
-    # Get cookies from Selenium
-    selenium_cookies = driver.get_cookies()  # list of dicts
-    cookies = {c['name']: c['value'] for c in selenium_cookies}
+def create_session(driver):
+    session = requests.Session()
 
     # Set headers to mimic browser
-    headers = {
+    session.headers.update({
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36"
-    }
+    })
+
+    # Get cookies from Selenium
+    selenium_cookies = driver.get_cookies()  # list of dicts
+    session.cookies.update({c['name']: c['value'] for c in selenium_cookies})
+    return session
 
+def download_page(session, img_url, local_path, page_num):
     # Download image
-    response = requests.get(img_url, headers=headers, cookies=cookies, stream=True)
+    response = session.get(img_url, stream=True)
     file_name = local_path + f"/page{page_num}.jpg"
+    # copy the body in 1 MB reads instead of a Python loop over 1 KB chunks
+    response.raw.decode_content = True
     with open(file_name, "wb") as f:
-        for chunk in response.iter_content(1024):
-            f.write(chunk)
+        shutil.copyfileobj(response.raw, f, length=1024 * 1024)
 
 
 def save_issue(title, link):
@@ -128,6 +134,9 @@ def save_issue(title, link):
     pages_string = pages_text.text.strip()
     num_pages = int(pages_string.split(" ")[-1])
 
+    # One session for the whole issue, so every page reuses the same connection and cookies
+    session = create_session(driver)
+
     # Create directory to store this issue's images
     local_dir = "./" + title.replace(" ", "_")
     os.makedirs(local_dir, exist_ok=True)  # won’t raise an error if it already exists
@@ -136,7 +145,7 @@ def save_issue(title, link):
     page_container = driver.find_element(By.CSS_SELECTOR, f".BRpagecontainer.pagediv0")
     page_img = page_container.find_element(By.TAG_NAME, "img")
     img_url = page_img.get_attribute("src")
-    download_page(driver, img_url, local_dir, 1)
+    download_page(session, img_url, local_dir, 1)
 
     # Start loop for saving remaining pages
     for page in range(1, num_pages):
@@ -152,8 +161,9 @@ def save_issue(title, link):
         img_url = page_img.get_attribute("src")
 
         # Download page
-        download_page(driver, img_url, local_dir, page+1)
+        download_page(session, img_url, local_dir, page+1)
 
+    session.close()
     driver.quit()
 
 def save_all_issues(csv_path):
@@ -11,103 +11,172 @@ from pathlib import Path
 import sys
 
 
-def calculate_iou(box1, box2):
+def iou_one_vs_many(box, boxes, area, areas):
     """
-    Calculate Intersection over Union (IoU) between two bounding boxes.
-    Boxes are in format (x, y, w, h).
+    Calculate Intersection over Union (IoU) between one bounding box and an array of boxes.
+    Boxes are in format (x1, y1, x2, y2); area and areas are their precomputed areas.
     """
-    x1, y1, w1, h1 = box1
-    x2, y2, w2, h2 = box2
-    
-    # Calculate intersection rectangle
-    x_left = max(x1, x2)
-    y_top = max(y1, y2)
-    x_right = min(x1 + w1, x2 + w2)
-    y_bottom = min(y1 + h1, y2 + h2)
-    
-    if x_right < x_left or y_bottom < y_top:
-        return 0.0
+    # Calculate intersection rectangles
+    inter_w = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    intersection_area = inter_w * inter_h
+    union_area = area + areas - intersection_area
+
+    return np.divide(intersection_area, union_area, out=np.zeros(len(boxes)), where=union_area > 0)
+
+
+def pairwise_iou(boxes, areas):
+    """
+    Calculate the N x N matrix of IoUs between all pairs of boxes.
+    Boxes are in format (x1, y1, x2, y2); areas are their precomputed areas.
+    """
+    inter_w = np.clip(np.minimum(boxes[:, None, 2], boxes[None, :, 2]) - np.maximum(boxes[:, None, 0], boxes[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(boxes[:, None, 3], boxes[None, :, 3]) - np.maximum(boxes[:, None, 1], boxes[None, :, 1]), 0, None)
+    intersection_area = inter_w * inter_h
+    union_area = areas[:, None] + areas[None, :] - intersection_area
+
+    return np.divide(intersection_area, union_area, out=np.zeros(union_area.shape), where=union_area > 0)
+
+
+def nms_indices(boxes, areas, iou_threshold=0.3, fast=False):
+    """
+    Non-Maximum Suppression over an (N, 4) array of boxes in format (x1, y1, x2, y2) with their areas.
+    Keeps smaller boxes when there's significant overlap; returns the indices of the kept boxes, smallest first.
+    With fast=True, uses Fast-NMS: one IoU matrix instead of the sequential loop, where a box is also removed
+    when it overlaps a smaller box that was itself removed (so it can remove slightly more boxes).
+    """
+    # Sort by area (smallest first)
+    order = np.argsort(areas, kind='stable')
+    boxes, areas = boxes[order], areas[order]
+
+    if fast:
+        # keep each box whose IoU with every smaller box is below the threshold
+        iou = np.triu(pairwise_iou(boxes, areas), k=1)
+        return order[iou.max(axis=0, initial=0) < iou_threshold]
     
-    intersection_area = (x_right - x_left) * (y_bottom - y_top)
-    box1_area = w1 * h1
-    box2_area = w2 * h2
-    union_area = box1_area + box2_area - intersection_area
+    keep = []
+    while len(order) > 0:
+        keep.append(order[0])
+        
+        # Remove boxes that overlap significantly with current box
+        remaining = iou_one_vs_many(boxes[0], boxes[1:], areas[0], areas[1:]) < iou_threshold
+        order, boxes, areas = order[1:][remaining], boxes[1:][remaining], areas[1:][remaining]
     
-    return intersection_area / union_area if union_area > 0 else 0
+    return np.array(keep, dtype=np.intp)
+
+
+def xywh_to_xyxy(boxes):
+    """(N, 4) int64 array of (x1, y1, x2, y2) boxes from a sequence of (x, y, w, h) boxes."""
+    xywh = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    return np.column_stack((xywh[:, :2], xywh[:, :2] + xywh[:, 2:]))
+
+
+def xyxy_to_xywh(boxes):
+    """List of (x, y, w, h) tuples from an (N, 4) array of (x1, y1, x2, y2) boxes."""
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in boxes.tolist()]
+
+
+def box_areas(boxes):
+    """Areas of an (N, 4) array of (x1, y1, x2, y2) boxes."""
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
 
 
-def non_max_suppression(boxes, iou_threshold=0.3):
+def non_max_suppression(boxes, iou_threshold=0.3, fast=False):
     """
     Remove overlapping bounding boxes using Non-Maximum Suppression.
     Keeps smaller boxes when there's significant overlap.
+    Boxes are in format (x, y, w, h); see nms_indices for fast.
     """
     if len(boxes) == 0:
         return []
     
-    # Sort by area (smallest first)
-    boxes_with_area = [(box, box[2] * box[3]) for box in boxes]
-    boxes_with_area.sort(key=lambda x: x[1], reverse=False)
-    
-    keep = []
-    while boxes_with_area:
-        current_box, _ = boxes_with_area.pop(0)
-        keep.append(current_box)
-        
-        # Remove boxes that overlap significantly with current box
-        boxes_with_area = [
-            (box, area) for box, area in boxes_with_area
-            if calculate_iou(current_box, box) < iou_threshold
-        ]
-    
-    return keep
+    xyxy = xywh_to_xyxy(boxes)
+    return [boxes[i] for i in nms_indices(xyxy, box_areas(xyxy), iou_threshold=iou_threshold, fast=fast)]
+
 
+def to_host(mat):
+    """numpy array of mat, downloading it if it is a cv2.UMat"""
+    return mat.get() if isinstance(mat, cv2.UMat) else mat
 
-def is_likely_text_box(region, gray_img, x, y, w, h):
+
+def cached_array(img_path, name, compute, use_cache=True):
+    """
+    Return compute(), memoized on disk next to the image as <image>.<name>.npz while the image's mtime is unchanged.
+    name should identify the parameters compute depends on.
+    """
+    if not use_cache:
+        return compute()
+    
+    cache_path = Path(f"{img_path}.{name}.npz")
+    mtime = Path(img_path).stat().st_mtime_ns
+    if cache_path.exists():
+        with np.load(cache_path) as cached:
+            if cached['mtime'] == mtime:
+                return cached['array']
+    
+    array = compute()
+    np.savez(cache_path, array=array, mtime=mtime)
+    return array
+
+
+def fill_holes(binary):
+    """
+    Fill the holes of the foreground regions of a binary image, so each connected component covers
+    the same area as the outer contour returned by cv2.findContours with RETR_EXTERNAL.
     """
-    Determine if a region is likely to be a text box/ad rather than an image.
+    # background reachable from outside the image (4-connected, as findContours treats the background)
+    outside = cv2.copyMakeBorder(binary, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(outside, None, (0, 0), 255, flags=4)
+    return binary | cv2.bitwise_not(outside[1:-1, 1:-1])
+
+
+def box_sums(integral, x1, y1, x2, y2):
+    """
+    Sums of the pixels in the boxes (x1, y1, x2, y2), from a summed-area table as returned by cv2.integral.
+    The coordinates can be scalars or arrays of the same shape.
+    """
+    return integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+
+
+def is_likely_text_box(edge_integral, gray_integrals, boxes, areas):
+    """
+    Determine which regions are likely to be text boxes/ads rather than images.
     Text boxes typically have:
     - Higher edge density (lots of fine edges from text)
     - More uniform intensity distribution
     - Horizontal line patterns (text lines)
+    Works on an (N, 4) array of (x1, y1, x2, y2) boxes with their areas at once, using summed-area tables of
+    the page's (0/1) Canny edges and of gray and gray^2 (as returned by cv2.integral2); returns a boolean array.
     """
-    # Extract the region
-    roi = gray_img[y:y+h, x:x+w]
+    x1, y1, x2, y2 = boxes.T
+    w, h = x2 - x1, y2 - y1
     
     # 1. Check edge density (text has many fine edges)
-    edges = cv2.Canny(roi, 50, 150)
-    edge_density = np.sum(edges > 0) / (w * h)
+    edge_density = box_sums(edge_integral, x1, y1, x2, y2) / areas
     
     # 2. Check for horizontal line patterns (text lines)
-    # Use horizontal morphological operation
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (w // 4, 1))
-    horizontal_lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, horizontal_kernel)
-    horizontal_line_density = np.sum(horizontal_lines > 0) / (w * h)
+    # Fraction of rows with edges over more than a quarter of the width: the edge count of every row of every box
+    # as a 1-pixel-high box, then the qualifying rows counted per box
+    box_ids = np.repeat(np.arange(len(h)), h)
+    rows = y1[box_ids] + np.arange(len(box_ids)) - np.repeat(np.cumsum(h) - h, h)
+    row_edge_counts = box_sums(edge_integral, x1[box_ids], rows, x2[box_ids], rows + 1)
+    horizontal_line_density = np.bincount(box_ids, weights=row_edge_counts > w[box_ids] / 4, minlength=len(h)) / h
     
     # 3. Check variance (images typically have higher variance)
-    variance = np.var(roi)
-    
     # 4. Check if region is mostly white/empty (borders of ad boxes)
-    mean_intensity = np.mean(roi)
+    sum_integral, sqsum_integral = gray_integrals
+    mean_intensity = box_sums(sum_integral, x1, y1, x2, y2) / areas
+    variance = box_sums(sqsum_integral, x1, y1, x2, y2) / areas - mean_intensity ** 2
     
     # Heuristics for text detection:
     # High edge density + horizontal lines + low variance = likely text
-    is_text = False
-    
-    if edge_density > 0.15:  # High edge density suggests text
-        is_text = True
-    
-    if horizontal_line_density > 0.1:  # Strong horizontal patterns suggest text lines
-        is_text = True
-    
-    if variance < 500:  # Low variance suggests uniform content (text or border)
-        is_text = True
-    
-    if mean_intensity > 200:  # Mostly white suggests empty ad box
-        is_text = True
+    is_text = ((edge_density > 0.15) |  # High edge density suggests text
+               (horizontal_line_density > 0.1) |  # Strong horizontal patterns suggest text lines
+               (variance < 500) |  # Low variance suggests uniform content (text or border)
+               (mean_intensity > 200))  # Mostly white suggests empty ad box
     
     # Images typically have moderate variance and lower edge density
-    if variance > 1000 and edge_density < 0.1:
-        is_text = False
+    is_text &= ~((variance > 1000) & (edge_density < 0.1))
     
     return is_text
 
@@ -119,6 +188,9 @@ def detect_images_improved(img_path,
                           max_aspect_ratio=3.0,
                           iou_threshold=0.3,
                           filter_text_boxes=True,
+                          fast_nms=False,
+                          downsample=1,
+                          use_cache=False,
                           debug=False):
     """
     Improved image detection with overlap removal and text box filtering.
@@ -130,72 +202,97 @@ def detect_images_improved(img_path,
     - max_aspect_ratio: Maximum width/height ratio
     - iou_threshold: IoU threshold for non-max suppression (lower = more aggressive)
     - filter_text_boxes: Whether to filter out likely text boxes
+    - fast_nms: Use Fast-NMS (one IoU matrix) instead of sequential non-maximum suppression
+    - downsample: Find candidate regions on the page shrunk by this integer factor (the filters still use full resolution)
+    - use_cache: Reuse the thresholded page and Canny edges saved next to the image by an earlier run
     - debug: Show intermediate processing steps
     """
     print(f"Processing: {img_path}")
     
-    img = cv2.imread(str(img_path))
-    if img is None:
+    # detection only needs grayscale, so decode straight to it (the color image is loaded separately for drawing)
+    gray = cv2.imread(str(img_path), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
         raise ValueError(f"Could not read image: {img_path}")
     
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # when OpenCL is available, the whole-page filters run on the GPU through OpenCV's transparent API;
+    # the per-box statistics use the host copy of gray
+    gray_device = cv2.UMat(gray) if cv2.ocl.useOpenCL() else gray
     img_area = gray.shape[0] * gray.shape[1]
     max_area = img_area * max_area_ratio
     
     # Step 1: Basic thresholding and contour detection
-    _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    def threshold():
+        small = gray_device
+        if downsample > 1:
+            small = cv2.resize(gray_device, None, fx=1 / downsample, fy=1 / downsample, interpolation=cv2.INTER_AREA)
+        _, binary = cv2.threshold(small, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return to_host(binary)
+    
+    binary = cached_array(img_path, f"binary{downsample}", threshold, use_cache)
     
     if debug:
         cv2.imwrite('debug_1_binary.jpg', binary)
         print("Saved debug_1_binary.jpg")
     
-    # Step 2: Find contours
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    print(f"Found {len(contours)} initial contours")
+    # Step 2: Find outer regions (bounding boxes of the hole-filled connected components,
+    # i.e. of the external contours, without tracing every contour)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(fill_holes(binary), connectivity=8)
+    stats = stats[1:]  # label 0 is the background
+    print(f"Found {len(stats)} initial contours")
     
     # Step 3: Filter by size and aspect ratio
-    boxes = []
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        area = w * h
-        aspect_ratio = w / h if h > 0 else 0
-        
-        if (area > min_area and 
-            area < max_area and 
-            min_aspect_ratio < aspect_ratio < max_aspect_ratio):
-            boxes.append((x, y, w, h))
+    # (boxes are kept as an (N, 4) array of (x1, y1, x2, y2) in full-resolution pixels with their areas
+    # until they are returned)
+    boxes = xywh_to_xyxy(stats[:, :4])
+    if downsample > 1:
+        boxes = np.minimum(boxes * downsample, [gray.shape[1], gray.shape[0]] * 2)
+    areas = box_areas(boxes)
+    aspect_ratio = (boxes[:, 2] - boxes[:, 0]) / (boxes[:, 3] - boxes[:, 1])
+    keep = ((areas > min_area) & 
+            (areas < max_area) & 
+            (min_aspect_ratio < aspect_ratio) & (aspect_ratio < max_aspect_ratio))
+    boxes, areas = boxes[keep], areas[keep]
     
     print(f"After size/aspect filtering: {len(boxes)} boxes")
     
     # Step 4: Apply non-maximum suppression to remove overlaps
-    boxes = non_max_suppression(boxes, iou_threshold=iou_threshold)
+    keep = nms_indices(boxes, areas, iou_threshold=iou_threshold, fast=fast_nms)
+    boxes, areas = boxes[keep], areas[keep]
     print(f"After overlap removal: {len(boxes)} boxes")
     
     # Step 5: Filter out text boxes/ads if enabled
     if filter_text_boxes:
-        filtered_boxes = []
-        for x, y, w, h in boxes:
-            roi = gray[y:y+h, x:x+w]
-            if not is_likely_text_box(roi, gray, x, y, w, h):
-                filtered_boxes.append((x, y, w, h))
-            else:
-                if debug:
-                    print(f"  Filtered out text box at ({x}, {y}) - {w}x{h}")
+        # run Canny once on the whole page; all boxes are then classified together from summed-area tables
+        edges_full = cached_array(img_path, "edges", lambda: to_host(cv2.Canny(gray_device, 50, 150)), use_cache)
+        edge_integral = cv2.integral((edges_full > 0).astype(np.uint8))
+        is_text = is_likely_text_box(edge_integral, cv2.integral2(gray), boxes, areas)
+        if debug:
+            for x, y, w, h in xyxy_to_xywh(boxes[is_text]):
+                print(f"  Filtered out text box at ({x}, {y}) - {w}x{h}")
         
-        boxes = filtered_boxes
+        boxes, areas = boxes[~is_text], areas[~is_text]
         print(f"After text box filtering: {len(boxes)} boxes")
 
     # Step 6: filter out images with too high proportion of white pixels (likely false positive, or text only)
-    final_boxes = []
-    for x, y, w, h in boxes[:]:
-        roi = gray[y:y+h, x:x+w]
-        num_white = np.sum(roi > 180)
-        num_white_ratio = num_white / (w * h)
-        if num_white_ratio > 0.5:
-            continue
-        final_boxes.append((x, y, w, h))
+    # (white pixel counts of all boxes at once, from a summed-area table of the white pixels)
+    white_integral = cv2.integral((gray > 180).astype(np.uint8))
+    num_white_ratio = box_sums(white_integral, *boxes.T) / areas
+    final_boxes = xyxy_to_xywh(boxes[num_white_ratio <= 0.5])
     
-    return final_boxes, img, gray
+    return final_boxes, gray
+
+
+def load_color_for_drawing(img_path):
+    """Load the color image that detections are drawn on."""
+    img = cv2.imread(str(img_path))
+    if img is None:
+        raise ValueError(f"Could not read image: {img_path}")
+    return img
+
+
+def fill_rect(img, x1, y1, x2, y2, color):
+    """Fill img[y1:y2, x1:x2] with color, clipping the rectangle to the image."""
+    img[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = color
 
 
 def draw_results(img, boxes, color=(0, 255, 0), thickness=3):
@@ -203,15 +300,20 @@ def draw_results(img, boxes, color=(0, 255, 0), thickness=3):
     result = img.copy()
     
     for i, (x, y, w, h) in enumerate(boxes):
-        # Draw rectangle
-        cv2.rectangle(result, (x, y), (x + w, y + h), color, thickness)
+        # Draw rectangle (the four borders as slice writes, thickness pixels wide and centered on the box edges)
+        left, top = x - thickness // 2, y - thickness // 2
+        right, bottom = left + w + thickness, top + h + thickness
+        fill_rect(result, left, top, right, top + thickness, color)
+        fill_rect(result, left, bottom - thickness, right, bottom, color)
+        fill_rect(result, left, top, left + thickness, bottom, color)
+        fill_rect(result, right - thickness, top, right, bottom, color)
         
         # Add label with number and dimensions
         label = f"#{i+1}: {w}x{h}"
         
         # Put label background
         (label_w, label_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-        cv2.rectangle(result, (x, y - label_h - 10), (x + label_w + 10, y), color, -1)
+        fill_rect(result, x, y - label_h - 10, x + label_w + 11, y + 1, color)
         
         # Put label text
         cv2.putText(result, label, (x + 5, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 
@@ -250,6 +352,12 @@ Parameters to adjust:
                        help='IoU threshold for overlap removal (default: 0.3, lower=more aggressive)')
     parser.add_argument('--no-filter-text', action='store_true',
                        help='Disable text box filtering')
+    parser.add_argument('--fast-nms', action='store_true',
+                       help='Use Fast-NMS for overlap removal (may remove slightly more boxes)')
+    parser.add_argument('--downsample', type=int, default=1,
+                       help='Find candidate regions on the page shrunk by this factor, e.g. 2 (default: 1)')
+    parser.add_argument('--cache', action='store_true',
+                       help='Save the thresholded page and edges next to the input and reuse them on later runs')
     parser.add_argument('--debug', action='store_true',
                        help='Save debug images showing processing steps')
     
@@ -273,17 +381,20 @@ Parameters to adjust:
     
     # Run detection
     try:
-        boxes, img, gray = detect_images_improved(
+        boxes, gray = detect_images_improved(
             input_path,
             min_area=args.min_area,
             max_area_ratio=args.max_area_ratio,
             iou_threshold=args.iou_threshold,
             filter_text_boxes=not args.no_filter_text,
+            fast_nms=args.fast_nms,
+            downsample=args.downsample,
+            use_cache=args.cache,
             debug=args.debug
         )
         
         # Draw results
-        result = draw_results(img, boxes)
+        result = draw_results(load_color_for_drawing(input_path), boxes)
         
         # Save output
         cv2.imwrite(str(output_path), result)